@@ -24,7 +24,7 @@
 """python-keycloak-async library."""
 
 from ._version import __version__
-from .connection import ConnectionManager
+from .connection import ConnectionManager, install_uvloop
 from .exceptions import (
     KeycloakAuthenticationError,
     KeycloakAuthorizationConfigError,
@@ -65,4 +65,5 @@ __all__ = [
     "KeycloakOpenID",
     "KeycloakOpenIDConnection",
     "KeycloakUMA",
+    "install_uvloop",
 ]
@@ -23,57 +23,189 @@
 
 """Connection manager module."""
 
-from urllib.parse import urljoin
+import asyncio
+import warnings
+import weakref
+from typing import Awaitable
+from urllib.request import getproxies
 
 import httpx
 
 from .exceptions import KeycloakConnectionError
 
+_JSON_HEADERS = httpx.Headers({"Content-Type": "application/json"})
 
-class ConnectionManager(object):
+
+def _strip_none(params):
+    """Drop query parameters without a value.
+
+    httpx would send them as empty values, unlike requests which omits them.
+
+    :param params: Query parameters
+    :type params: dict
+    :returns: Query parameters with a value
+    :rtype: dict
+    """
+    return {k: v for k, v in params.items() if v is not None}
+
+
+def install_uvloop():
+    """Use uvloop for new asyncio event loops, if it is installed.
+
+    Call this before the event loop is created, e.g. before ``asyncio.run``;
+    a loop that is already running keeps its implementation.
+
+    :returns: True if uvloop is installed and now used.
+    :rtype: bool
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+def _env_proxies():
+    """Check whether proxies are configured through the environment.
+
+    :returns: True if an HTTP(S)_PROXY or ALL_PROXY variable is set.
+    :rtype: bool
+    """
+    env_proxies = getproxies()
+    return any(env_proxies.get(scheme) for scheme in ("http", "https", "all"))
+
+
+def _warn_unclosed(client):
+    """Warn when a connection is garbage collected without being closed.
+
+    :param client: The connection's httpx client
+    :type client: httpx.AsyncClient
+    """
+    if not client.is_closed:
+        warnings.warn(
+            "ConnectionManager was not closed, use 'await aclose()' or 'async with'",
+            ResourceWarning,
+        )
+
+
+class ConnectionManager:
     """Represents a simple server connection.
 
     :param base_url: The server URL.
     :type base_url: str
     :param headers: The header parameters of the requests to the server.
-    :type headers: dict
+    :type headers: dict | httpx.Headers
     :param timeout: Timeout to use for requests to the server.
     :type timeout: int
     :param verify: Verify server SSL.
     :type verify: bool
     :param proxies: The proxies servers requests is sent by.
     :type proxies: dict
+    :param coalesce_gets: Share one response between concurrent identical GET requests.
+    :type coalesce_gets: bool
+    :param http2: Negotiate HTTP/2 with the server.
+    :type http2: bool
+    :param retries: Number of retries when a connection can't be established.
+        Not applied to requests sent through a proxy, including proxies from the environment.
+    :type retries: int
     """
 
-    def __init__(self, base_url, headers=None, timeout=60, verify=True, proxies=None):
+    # only the attributes with side effects on the client go through properties
+    __slots__ = (
+        "_base_url",
+        "_timeout",
+        "_timeout_obj",
+        "verify",
+        "coalesce_gets",
+        "_inflight",
+        "_s",
+        "__weakref__",
+    )
+
+    def __init__(
+        self,
+        base_url,
+        headers=None,
+        timeout=60,
+        verify=True,
+        proxies=None,
+        coalesce_gets=False,
+        http2=True,
+        retries=1,
+    ):
         """Init method.
 
         :param base_url: The server URL.
         :type base_url: str
         :param headers: The header parameters of the requests to the server.
-        :type headers: dict
+        :type headers: dict | httpx.Headers
         :param timeout: Timeout to use for requests to the server.
         :type timeout: int
         :param verify: Verify server SSL.
         :type verify: bool
         :param proxies: The proxies servers requests is sent by.
         :type proxies: dict
+        :param coalesce_gets: Share one response between concurrent identical GET requests.
+            The response object is shared as well, so callers must not mutate it.
+        :type coalesce_gets: bool
+        :param http2: Negotiate HTTP/2 with the server, so concurrent requests share
+            one connection.
+        :type http2: bool
+        :param retries: Number of retries when a connection can't be established.
+            Defaults to one, to reset the connection after Keycloak's connection timeout.
+            Not applied to requests sent through a proxy, including proxies from the
+            environment (HTTP_PROXY, HTTPS_PROXY, ALL_PROXY).
+        :type retries: int
         """
+        self._s = None
         if headers is None:
             headers = {}
         self.base_url = base_url
-        self.headers = headers
         self.timeout = timeout
         self.verify = verify
-        self._s = httpx.AsyncClient(verify=verify, proxies=proxies)
+        self.coalesce_gets = coalesce_gets
+        self._inflight = {}
+        limits = httpx.Limits(max_keepalive_connections=100, max_connections=200)
+        transport = None
+        # httpx ignores the proxy environment variables once a transport is given
+        if proxies is not None or not _env_proxies():
+            # retry to reset connection with Keycloak after  tomcat's ConnectionTimeout
+            # see https://github.com/marcospereirampj/python-keycloak/issues/36
+            transport = httpx.AsyncHTTPTransport(
+                verify=verify, http2=http2, limits=limits, retries=retries
+            )
+        self._s = httpx.AsyncClient(
+            base_url=base_url,
+            verify=verify,
+            proxies=proxies,
+            http2=http2,
+            timeout=self._timeout_obj,
+            headers=headers,
+            limits=limits,
+            transport=transport,
+        )
         self._s.auth = None  # don't let requests add auth headers
+        weakref.finalize(self, _warn_unclosed, self._s).atexit = False
 
-        # retry once to reset connection with Keycloak after  tomcat's ConnectionTimeout
-        # see https://github.com/marcospereirampj/python-keycloak/issues/36
-        self._s.transport = httpx.AsyncHTTPTransport(retries=1)
+    async def __aenter__(self):
+        """Enter the connection context.
+
+        :returns: The connection manager
+        :rtype: ConnectionManager
+        """
+        return self
+
+    async def __aexit__(self, *excinfo):
+        """Close the connection when leaving the context.
+
+        :param excinfo: Exception information, if any
+        :type excinfo: tuple
+        """
+        await self.aclose()
 
     async def aclose(self):
-        if hasattr(self, "_s"):
+        if self._s is not None:
             await self._s.aclose()
 
     @property
@@ -88,6 +220,8 @@ class ConnectionManager(object):
     @base_url.setter
     def base_url(self, value):
         self._base_url = value
+        if self._s is not None:
+            self._s.base_url = value
 
     @property
     def timeout(self):
@@ -101,32 +235,24 @@ class ConnectionManager(object):
     @timeout.setter
     def timeout(self, value):
         self._timeout = value
-
-    @property
-    def verify(self):
-        """Return verify in use for request to the server.
-
-        :returns: Verify indicator
-        :rtype: bool
-        """
-        return self._verify
-
-    @verify.setter
-    def verify(self, value):
-        self._verify = value
+        self._timeout_obj = httpx.Timeout(value)
+        if self._s is not None:
+            self._s.timeout = self._timeout_obj
 
     @property
     def headers(self):
         """Return header request to the server.
 
+        These are the client's default headers, so changes apply to all later requests.
+
         :returns: Request headers
-        :rtype: dict
+        :rtype: httpx.Headers
         """
-        return self._headers
+        return self._s.headers
 
     @headers.setter
     def headers(self, value):
-        self._headers = value
+        self._s.headers = value
 
     def param_headers(self, key):
         """Return a specific header parameter.
@@ -170,24 +296,97 @@ class ConnectionManager(object):
         """
         self.headers.pop(key, None)
 
+    def set_json_default(self):
+        """Send JSON by default.
+
+        Requests with form data or files need their own Content-Type header afterwards.
+        """
+        self.headers.update(_JSON_HEADERS)
+
     async def raw_get(self, path, **kwargs) -> httpx.Response:
         """Submit get request to the path.
 
+        With ``coalesce_gets`` enabled, concurrent calls with the same path, arguments and
+        connection headers await a single request.
+
+        :param path: Path for request.
+        :type path: str
+        :param kwargs: Additional arguments
+        :returns: Response the request.
+        """
+        if not self.coalesce_gets:
+            return await self._send(self._build_get(path, kwargs))
+
+        # the headers are part of the key, so a changed Authorization gets its own request
+        key = (path, tuple(sorted(kwargs.items())), tuple(self.headers.multi_items()))
+        try:
+            task = self._inflight.get(key)
+        except TypeError:
+            # unhashable query values can't be coalesced
+            return await self._send(self._build_get(path, kwargs))
+        if task is None:
+            # only built on a miss, before the task is scheduled, so it carries the headers
+            # of the key
+            task = asyncio.ensure_future(self._send(self._build_get(path, kwargs)))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # a cancelled caller must not cancel the request shared with the others
+        return await asyncio.shield(task)
+
+    def raw_get_nothrow(self, path, **kwargs) -> Awaitable[httpx.Response]:
+        """Submit get request to the path without wrapping it in a coroutine.
+
+        Unlike raw_get, httpx errors are raised as-is, GET requests are not coalesced and
+        overrides of raw_get (such as the token refresh of KeycloakOpenIDConnection) are skipped.
+
         :param path: Path for request.
         :type path: str
         :param kwargs: Additional arguments
+        :returns: Awaitable of the response.
+        """
+        return self._s.get(path, params=_strip_none(kwargs))
+
+    async def raw_get_many(self, items, *, concurrency=16) -> list:
+        """Submit several get requests concurrently.
+
+        :param items: Pairs of path and additional arguments for each request.
+        :type items: Iterable[tuple[str, dict]]
+        :param concurrency: Maximum number of requests in flight at once.
+        :type concurrency: int
+        :returns: Responses of the requests, in the order of items.
+        :rtype: list[httpx.Response]
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get(path, kwargs):
+            async with semaphore:
+                return await self.raw_get(path, **kwargs)
+
+        return await asyncio.gather(*(get(path, kwargs) for path, kwargs in items))
+
+    def _build_get(self, path, params) -> httpx.Request:
+        """Build a GET request with the current connection headers.
+
+        :param path: Path for request.
+        :type path: str
+        :param params: Query parameters, the ones without a value are dropped.
+        :type params: dict
+        :returns: The request.
+        """
+        return self._s.build_request("GET", path, params=_strip_none(params))
+
+    async def _send(self, request) -> httpx.Response:
+        """Send a request built by the client.
+
+        :param request: The request to send.
+        :type request: httpx.Request
         :returns: Response the request.
         :raises KeycloakConnectionError: HttpError Can't connect to server.
         """
         try:
-            return await self._s.get(
-                urljoin(self.base_url, path),
-                params=kwargs,
-                headers=self.headers,
-                timeout=self.timeout,
-            )
-        except Exception as e:
-            raise KeycloakConnectionError("Can't connect to server (%s)" % e)
+            return await self._s.send(request)
+        except httpx.HTTPError as e:
+            raise KeycloakConnectionError("Can't connect to server") from e
 
     async def raw_post(self, path, data=None, json=None, files=None, headers=None, **kwargs) -> httpx.Response:
         """Submit post request to the path.
@@ -204,23 +403,8 @@ class ConnectionManager(object):
         :type headers: dict | None
         :param kwargs: Additional arguments
         :returns: Response the request.
-        :raises KeycloakConnectionError: HttpError Can't connect to server.
         """
-        try:
-            _headers = self.headers
-            if headers is not None:
-                _headers.update(headers)
-            return await self._s.post(
-                urljoin(self.base_url, path),
-                params=kwargs,
-                data=data,
-                json=json,
-                files=files,
-                headers=_headers,
-                timeout=self.timeout,
-            )
-        except Exception as e:
-            raise KeycloakConnectionError("Can't connect to server (%s)" % e)
+        return await self._raw_body("POST", path, data, json, files, headers, **kwargs)
 
     async def raw_put(self, path, data=None, json=None, files=None, headers=None, **kwargs) -> httpx.Response:
         """Submit put request to the path.
@@ -237,23 +421,8 @@ class ConnectionManager(object):
         :type headers: dict | None
         :param kwargs: Additional arguments
         :returns: Response the request.
-        :raises KeycloakConnectionError: HttpError Can't connect to server.
         """
-        try:
-            _headers = self.headers
-            if headers is not None:
-                _headers.update(headers)
-            return await self._s.put(
-                urljoin(self.base_url, path),
-                params=kwargs,
-                data=data,
-                json=json,
-                files=files,
-                headers=_headers,
-                timeout=self.timeout,
-            )
-        except Exception as e:
-            raise KeycloakConnectionError("Can't connect to server (%s)" % e)
+        return await self._raw_body("PUT", path, data, json, files, headers, **kwargs)
 
     async def raw_delete(self, path, json=None, data=None, **kwargs) -> httpx.Response:
         """Submit delete request to the path.
@@ -266,18 +435,38 @@ class ConnectionManager(object):
         :type data: dict | list | None
         :param kwargs: Additional arguments
         :returns: Response the request.
-        :raises KeycloakConnectionError: HttpError Can't connect to server.
         """
-        try:
-            url = urljoin(self.base_url, path)
-            return await self._s.request(
-                "DELETE",
-                url,
-                json=json,
-                data=data,
-                params=kwargs,
-                headers=self.headers,
-                timeout=self.timeout,
-            )
-        except Exception as e:
-            raise KeycloakConnectionError("Can't connect to server (%s)" % e)
+        return await self._raw_body("DELETE", path, data, json, **kwargs)
+
+    async def _raw_body(
+        self, method, path, data=None, json=None, files=None, headers=None, **kwargs
+    ) -> httpx.Response:
+        """Submit a request with an optional body to the path.
+
+        :param method: HTTP method of the request.
+        :type method: str
+        :param path: Path for request.
+        :type path: str
+        :param data: Payload for request.
+        :type data: dict | list | None
+        :param json: JSON body for request.
+        :type json: dict | list | None
+        :param files: Multipart files.
+        :type files: dict | None
+        :param headers: Extra headers.
+        :type headers: dict | None
+        :param kwargs: Additional arguments
+        :returns: Response the request.
+        """
+        # the client already sends self.headers, so only pass the per-request extras.
+        # AsyncClient.delete does not accept a body, so build the request directly
+        request = self._s.build_request(
+            method,
+            path,
+            params=_strip_none(kwargs),
+            data=data,
+            json=json,
+            files=files,
+            headers=headers,
+        )
+        return await self._send(request)
@@ -70,9 +70,20 @@ class KeycloakAuthenticationError(KeycloakError):
 
 
 class KeycloakConnectionError(KeycloakError):
-    """Keycloak connection error exception."""
+    """Keycloak connection error exception.
 
-    pass
+    The underlying connection error is expected as the exception cause.
+    """
+
+    def __str__(self):
+        """Str method.
+
+        :returns: String representation of the object, including its cause
+        :rtype: str
+        """
+        if self.__cause__ is not None:
+            return "{0} ({1})".format(super().__str__(), self.__cause__)
+        return super().__str__()
 
 
 class KeycloakOperationError(KeycloakError):
@@ -151,10 +151,8 @@ class KeycloakAdmin:
         if auto_refresh_token is not None:
             self.auto_refresh_token = auto_refresh_token
         if token is not None:
-            self.connection.headers = {
-                "Authorization": "Bearer " + token.get("access_token"),
-                "Content-Type": "application/json",
-            }
+            self.connection.headers = {"Authorization": "Bearer " + token.get("access_token")}
+            self.connection.set_json_default()
 
     async def __aenter__(self):
         await self.init_token()
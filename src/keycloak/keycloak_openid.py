@@ -712,7 +712,6 @@ class KeycloakOpenID:
         """
         params_path = {"realm-name": self.realm_name}
         self.connection.add_param_headers("Authorization", "Bearer " + token)
-        self.connection.add_param_headers("Content-Type", "application/json")
         data_raw = await self.connection.raw_post(
             URL_CLIENT_REGISTRATION.format(**params_path), json=payload
         )
@@ -55,9 +55,7 @@ class KeycloakUMA:
         :type connection: KeycloakOpenIDConnection
         """
         self.connection = connection
-        custom_headers = self.connection.custom_headers or {}
-        custom_headers.update({"Content-Type": "application/json"})
-        self.connection.custom_headers = custom_headers
+        self.connection.set_json_default()
         self._well_known = None
 
     async def __aenter__(self):
@@ -323,9 +321,11 @@ class KeycloakUMA:
         if len(payload["permission"]) == 0:
             return True
 
-        connection = ConnectionManager(self.connection.base_url)
-        connection.add_param_headers("Authorization", "Bearer " + token)
-        data_raw = await connection.raw_post((await self.uma_well_known())["token_endpoint"], data=payload)
+        async with ConnectionManager(self.connection.base_url) as connection:
+            connection.add_param_headers("Authorization", "Bearer " + token)
+            data_raw = await connection.raw_post(
+                (await self.uma_well_known())["token_endpoint"], data=payload
+            )
         try:
             data = raise_error_from_response(data_raw, KeycloakPostError)
         except KeycloakPostError:
@@ -45,7 +45,6 @@ class KeycloakOpenIDConnection(ConnectionManager):
     _totp = None
     _realm_name = None
     _client_id = None
-    _verify = None
     _client_secret_key = None
     _connection = None
     _custom_headers = None
@@ -95,20 +94,19 @@ class KeycloakOpenIDConnection(ConnectionManager):
         :param timeout: connection timeout in seconds
         :type timeout: int
         """
+        super().__init__(base_url=server_url, timeout=timeout, verify=verify)
+
         # token is renewed when it hits 90% of its lifetime. This is to account for any possible
         # clock skew.
         self.token_lifetime_fraction = 0.9
-        self.server_url = server_url
         self.username = username
         self.password = password
         self.token = token
         self.totp = totp
         self.realm_name = realm_name
         self.client_id = client_id
-        self.verify = verify
         self.client_secret_key = client_secret_key
         self.user_realm_name = user_realm_name
-        self.timeout = timeout
 
         self.keycloak_openid = KeycloakOpenID(
             server_url=self.server_url,
@@ -119,13 +117,8 @@ class KeycloakOpenIDConnection(ConnectionManager):
             timeout=self.timeout,
         )
 
-        self.headers = {}
         self.custom_headers = custom_headers
 
-        super().__init__(
-            base_url=self.server_url, headers=self.headers, timeout=60, verify=self.verify
-        )
-
     async def aclose(self):
         await super().aclose()
         await self.keycloak_openid.aclose()
@@ -133,14 +126,11 @@ class KeycloakOpenIDConnection(ConnectionManager):
     async def init_token(self):
         await self.get_token()
 
-        self.headers = (
-            {
-                "Authorization": "Bearer " + self.token.get("access_token"),
-                "Content-Type": "application/json",
-            }
-            if self.token is not None
-            else {}
-        )
+        if self.token is None:
+            self.headers = {}
+        else:
+            self.headers = {"Authorization": "Bearer " + self.token.get("access_token")}
+            self.set_json_default()
 
     @property
     def server_url(self):
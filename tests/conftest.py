@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 from typing import Tuple
 
 import freezegun
+import httpx
 import pytest
 import pytest_asyncio
 from cryptography import x509
@@ -16,6 +17,7 @@ from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.x509.oid import NameOID
 
 from keycloak import KeycloakAdmin, KeycloakOpenID, KeycloakOpenIDConnection, KeycloakUMA
+from keycloak.connection import ConnectionManager
 
 pytest_plugins = ('pytest_asyncio',)
 
@@ -529,3 +531,61 @@ async def uma(oid_connection_with_authz: KeycloakOpenIDConnection):
     # Return UMA
     async with KeycloakUMA(connection=connection) as client:
         yield client
+
+
+@pytest.fixture
+def no_env_proxies(monkeypatch):
+    """Fixture clearing the proxy environment variables.
+
+    With a proxy in the environment, the connection manager leaves the transports to httpx.
+
+    :param monkeypatch: Pytest monkeypatch fixture
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY"):
+        monkeypatch.delenv(name, raising=False)
+        monkeypatch.delenv(name.lower(), raising=False)
+
+
+@pytest_asyncio.fixture
+async def mock_connection(no_env_proxies):
+    """Fixture for connection managers answered by a mock transport.
+
+    :param no_env_proxies: Fixture clearing the proxy environment variables
+    :type no_env_proxies: None
+    :yields: Factory taking the request handler and the connection manager arguments
+    :rtype: Callable
+    """
+    connections = []
+
+    def factory(handler, base_url="http://test.test", **kwargs):
+        cm = ConnectionManager(base_url=base_url, **kwargs)
+        cm._s._transport = httpx.MockTransport(handler)
+        connections.append(cm)
+        return cm
+
+    yield factory
+    for cm in connections:
+        await cm.aclose()
+
+
+@pytest.fixture
+def transport_kwargs(monkeypatch, no_env_proxies):
+    """Fixture recording the arguments the HTTP transports are created with.
+
+    :param monkeypatch: Pytest monkeypatch fixture
+    :type monkeypatch: pytest.MonkeyPatch
+    :param no_env_proxies: Fixture clearing the proxy environment variables
+    :type no_env_proxies: None
+    :returns: Arguments of every transport created, in order
+    :rtype: list
+    """
+    calls = []
+
+    class Transport(httpx.AsyncHTTPTransport):
+        def __init__(self, **kwargs):
+            calls.append(kwargs)
+            super().__init__(**kwargs)
+
+    monkeypatch.setattr(httpx, "AsyncHTTPTransport", Transport)
+    return calls
@@ -1,8 +1,13 @@
 """Connection test module."""
 
+import asyncio
+import gc
+import sys
+
+import httpx
 import pytest
 
-from keycloak.connection import ConnectionManager
+from keycloak.connection import ConnectionManager, install_uvloop
 from keycloak.exceptions import KeycloakConnectionError
 
 
@@ -19,28 +24,251 @@ async def test_connection_proxy():
     await cm.aclose()
 
 
+@pytest.mark.asyncio
+async def test_connection_env_proxy(monkeypatch):
+    """Test proxies from the environment are used."""
+    monkeypatch.setenv("HTTPS_PROXY", "http://localhost:8080")
+    cm = ConnectionManager(base_url="https://test.test")
+    for k, v in cm._s._mounts.items():
+        assert k.pattern == "https://"
+        assert str(v._pool._proxy_url.origin) == "http://localhost:8080"
+        break
+    else:
+        pytest.fail("No proxy mounted")
+    await cm.aclose()
+
+
+@pytest.mark.asyncio
+async def test_http2(transport_kwargs):
+    """Test HTTP/2 can be turned off."""
+    async with ConnectionManager(base_url="http://test.test"):
+        assert transport_kwargs[-1]["http2"] is True
+    async with ConnectionManager(base_url="http://test.test", http2=False):
+        assert transport_kwargs[-1]["http2"] is False
+
+
+@pytest.mark.asyncio
+async def test_retries(transport_kwargs):
+    """Test the retries of the transport."""
+    async with ConnectionManager(base_url="http://test.test"):
+        assert transport_kwargs[-1]["retries"] == 1
+    async with ConnectionManager(base_url="http://test.test", retries=0):
+        assert transport_kwargs[-1]["retries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_timeout():
+    """Test the client follows timeout changes."""
+    cm = ConnectionManager(base_url="http://test.test", timeout=5)
+    assert cm._s.timeout == httpx.Timeout(5)
+    cm.timeout = 10
+    assert cm.timeout == 10
+    assert cm._s.timeout == httpx.Timeout(10)
+    await cm.aclose()
+
+
 @pytest.mark.asyncio
 async def test_headers():
     """Test headers manipulation."""
     cm = ConnectionManager(base_url="http://test.test", headers={"H": "A"})
     assert cm.param_headers(key="H") == "A"
     assert cm.param_headers(key="A") is None
+    assert cm.param_headers(key="h") == "A"
     cm.clean_headers()
-    assert cm.headers == dict()
+    assert not cm.exist_param_headers(key="H")
     cm.add_param_headers(key="H", value="B")
     assert cm.exist_param_headers(key="H")
     assert not cm.exist_param_headers(key="B")
     cm.del_param_headers(key="H")
     assert not cm.exist_param_headers(key="H")
+    cm.set_json_default()
+    assert cm.param_headers(key="Content-Type") == "application/json"
+    assert cm.param_headers(key="Accept") == "*/*"
     await cm.aclose()
 
 
+@pytest.mark.asyncio
+async def test_base_url(mock_connection):
+    """Test request urls follow base url changes."""
+
+    def handler(request):
+        return httpx.Response(200, text=str(request.url))
+
+    cm = mock_connection(handler, "http://test.test/")
+    assert (await cm.raw_get(path="admin/realms")).text == "http://test.test/admin/realms"
+    cm.base_url = "http://other.test/auth"
+    assert (await cm.raw_get(path="admin/realms")).text == "http://other.test/auth/admin/realms"
+    assert (await cm.raw_get(path="http://abs.test/x")).text == "http://abs.test/x"
+
+
+@pytest.mark.asyncio
+async def test_base_url_path(mock_connection):
+    """Test request paths are appended to the path of the base url."""
+
+    def handler(request):
+        return httpx.Response(200, text=str(request.url))
+
+    cm = mock_connection(handler, "http://h/auth")
+    # urljoin used to drop the last segment of a base url without trailing slash
+    assert (await cm.raw_get(path="realms/x")).text == "http://h/auth/realms/x"
+    cm.base_url = "http://h/auth/"
+    # and to resolve absolute paths against the host
+    assert (await cm.raw_get(path="/admin/x")).text == "http://h/auth/admin/x"
+
+
+@pytest.mark.asyncio
+async def test_extra_headers(mock_connection):
+    """Test extra headers are sent without altering the connection headers."""
+
+    def handler(request):
+        return httpx.Response(200, json=dict(request.headers))
+
+    cm = mock_connection(handler, headers={"H": "A"})
+    for method in (cm.raw_post, cm.raw_put):
+        sent = (await method(path="test", data={}, headers={"X": "B"})).json()
+        assert sent["h"] == "A"
+        assert sent["x"] == "B"
+    assert cm.headers["H"] == "A"
+    assert "X" not in cm.headers
+
+
+@pytest.mark.asyncio
+async def test_headers_mutation(mock_connection):
+    """Test changes made directly to the headers are sent."""
+
+    def handler(request):
+        return httpx.Response(200, json=dict(request.headers))
+
+    cm = mock_connection(handler)
+    cm.headers["Authorization"] = "Bearer x"
+    cm.headers.update({"X-Y": "z"})
+    sent = (await cm.raw_get(path="test")).json()
+    assert sent["authorization"] == "Bearer x"
+    assert sent["x-y"] == "z"
+    cm.headers = {"H": "A"}
+    sent = (await cm.raw_get(path="test")).json()
+    assert sent["h"] == "A"
+    assert "authorization" not in sent
+
+
+@pytest.mark.asyncio
+async def test_none_params(mock_connection):
+    """Test query parameters without a value are not sent."""
+
+    def handler(request):
+        return httpx.Response(200, json=dict(request.url.params))
+
+    cm = mock_connection(handler)
+    assert (await cm.raw_get(path="test", a="1", b=None)).json() == {"a": "1"}
+    assert (await cm.raw_delete(path="test", a=None)).json() == {}
+
+
+@pytest.mark.asyncio
+async def test_coalesce_gets(mock_connection):
+    """Test concurrent identical GET requests are sent once."""
+    calls = []
+
+    async def handler(request):
+        calls.append(str(request.url))
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={})
+
+    cm = mock_connection(handler, coalesce_gets=True)
+    responses = await asyncio.gather(
+        cm.raw_get(path="test", a="1"), cm.raw_get(path="test", a="1"), cm.raw_get(path="test")
+    )
+    assert len(calls) == 2
+    assert responses[0] is responses[1]
+    assert cm._inflight == {}
+    await cm.raw_get(path="test", a="1")
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_coalesce_gets_headers(mock_connection):
+    """Test GET requests with different connection headers are not coalesced."""
+    tokens = []
+
+    async def handler(request):
+        tokens.append(request.headers["Authorization"])
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, text=request.headers["Authorization"])
+
+    cm = mock_connection(handler, coalesce_gets=True)
+    cm.add_param_headers("Authorization", "Bearer a")
+    first = asyncio.ensure_future(cm.raw_get(path="test"))
+    await asyncio.sleep(0)
+    cm.add_param_headers("Authorization", "Bearer b")
+    second = asyncio.ensure_future(cm.raw_get(path="test"))
+    assert [(await first).text, (await second).text] == ["Bearer a", "Bearer b"]
+    assert sorted(tokens) == ["Bearer a", "Bearer b"]
+
+
+@pytest.mark.asyncio
+async def test_raw_get_nothrow(mock_connection):
+    """Test the GET request without error translation."""
+
+    def handler(request):
+        return httpx.Response(200, text=str(request.url))
+
+    cm = mock_connection(handler)
+    assert (await cm.raw_get_nothrow("test", a="1", b=None)).text == "http://test.test/test?a=1"
+
+    cm = ConnectionManager(base_url="http://not.real.domain")
+    with pytest.raises(httpx.HTTPError):
+        await cm.raw_get_nothrow(path="bad")
+    await cm.aclose()
+
+
+@pytest.mark.asyncio
+async def test_raw_get_many(mock_connection):
+    """Test several GET requests are sent concurrently within the limit."""
+    in_flight = []
+    peak = []
+
+    async def handler(request):
+        in_flight.append(request)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(request)
+        return httpx.Response(200, text=str(request.url))
+
+    cm = mock_connection(handler)
+    responses = await cm.raw_get_many(
+        [("test%d" % i, {"a": str(i)}) for i in range(5)], concurrency=2
+    )
+    assert [r.text for r in responses] == [
+        "http://test.test/test%d?a=%d" % (i, i) for i in range(5)
+    ]
+    assert max(peak) == 2
+
+
+@pytest.mark.asyncio
+async def test_context_manager():
+    """Test the connection is closed when leaving the context."""
+    async with ConnectionManager(base_url="http://test.test") as cm:
+        assert not cm._s.is_closed
+    assert cm._s.is_closed
+    await cm.aclose()
+
+
+@pytest.mark.asyncio
+async def test_unclosed_warning():
+    """Test a warning is emitted for connections that are never closed."""
+    cm = ConnectionManager(base_url="http://test.test")
+    with pytest.warns(ResourceWarning):
+        del cm
+        gc.collect()
+
+
 @pytest.mark.asyncio
 async def test_bad_connection():
     """Test bad connection."""
     cm = ConnectionManager(base_url="http://not.real.domain")
-    with pytest.raises(KeycloakConnectionError):
+    with pytest.raises(KeycloakConnectionError) as e:
         await cm.raw_get(path="bad")
+    assert isinstance(e.value.__cause__, httpx.HTTPError)
+    assert str(e.value) == "Can't connect to server (%s)" % e.value.__cause__
     with pytest.raises(KeycloakConnectionError):
         await cm.raw_delete(path="bad")
     with pytest.raises(KeycloakConnectionError):
@@ -48,3 +276,11 @@ async def test_bad_connection():
     with pytest.raises(KeycloakConnectionError):
         await cm.raw_put(path="bad", data={})
     await cm.aclose()
+
+
+def test_install_uvloop_missing(monkeypatch):
+    """Test installing uvloop is skipped when it isn't available."""
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    policy = asyncio.get_event_loop_policy()
+    assert not install_uvloop()
+    assert asyncio.get_event_loop_policy() is policy
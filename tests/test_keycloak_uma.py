@@ -1,9 +1,13 @@
 """Test module for KeycloakUMA."""
+import gc
 import re
+import warnings
 
+import httpx
 import pytest
 
 from keycloak import KeycloakAdmin, KeycloakOpenIDConnection, KeycloakUMA
+from keycloak.connection import ConnectionManager
 from keycloak.exceptions import (
     KeycloakDeleteError,
     KeycloakGetError,
@@ -315,3 +319,37 @@ async def test_uma_permission_ticket(uma: KeycloakUMA):
         await uma.permission_ticket_create(permissions)
 
     await uma.resource_set_delete(resource["_id"])
+
+
+@pytest.mark.asyncio
+async def test_uma_permissions_check_closes_connection(monkeypatch, no_env_proxies):
+    """Test the connection of the permissions check is closed.
+
+    :param monkeypatch: Pytest monkeypatch fixture
+    :type monkeypatch: pytest.MonkeyPatch
+    :param no_env_proxies: Fixture clearing the proxy environment variables
+    :type no_env_proxies: None
+    """
+
+    def handler(request):
+        assert request.headers["Authorization"] == "Bearer token"
+        return httpx.Response(200, json={"result": True})
+
+    class MockConnectionManager(ConnectionManager):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._s._transport = httpx.MockTransport(handler)
+
+    monkeypatch.setattr("keycloak.keycloak_uma.ConnectionManager", MockConnectionManager)
+    connection = KeycloakOpenIDConnection(
+        server_url="http://test.test", realm_name="r", client_id="c"
+    )
+    uma = KeycloakUMA(connection=connection)
+    uma._well_known = {"token_endpoint": "http://test.test/token"}
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ResourceWarning)
+        permissions = [UMAPermission(resource="r")]
+        assert await uma.permissions_check(token="token", permissions=permissions)
+        gc.collect()
+    assert not [w for w in caught if issubclass(w.category, ResourceWarning)]
+    await connection.aclose()